@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+=================================================================================
+ Module Name: atomic_io.py
+ Author: Davang Sikand
+ Purpose: Write output files atomically (temp file + os.replace)
+=================================================================================
+
+📌 USE CASE:
+-------------
+Shared by the preprocessing scripts (`convert_to_coco.py`,
+`split_coco_train_test.py`, `cache_frames.py`) so that a failed or
+interrupted run never leaves a truncated output behind: data is written to a
+temporary file in the destination directory and only moved onto the real
+path once it is complete. On error the temporary file is removed and any
+existing output is left untouched.
+
+=================================================================================
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Read the process umask once at import time, before any worker threads exist,
+# since os.umask can only be queried by temporarily changing it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yields a temporary path next to `path` and moves it onto `path` only once
+    the block completes. Useful for writers that need a path rather than a
+    file object (e.g. `np.memmap`).
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or None,
+        prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        yield tmp_path
+        # mkstemp creates the file 0600; give the output normal permissions
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def atomic_open(path, buffering=1 << 20):
+    """
+    Opens a temporary file next to `path` for binary writing and moves it onto
+    `path` only once the block completes.
+    """
+    with atomic_path(path) as tmp_path, open(tmp_path, "wb", buffering=buffering) as f:
+        yield f
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+=================================================================================
+ Script Name: cache_frames.py
+ Author: Davang Sikand
+ Purpose: Pre-decode training frames into a single memory-mapped uint8 file
+=================================================================================
+
+📌 USE CASE:
+-------------
+Every training iteration otherwise re-decodes the same PNG frames through
+libpng. This script decodes each frame of a COCO split once and stores the
+raw BGR pixels back to back in one flat file. `train_maskrcnn.py` picks the
+cache up automatically and slices frames out of it with `np.memmap`, so the
+data loader workers no longer decode images at all.
+
+Frames are stored at their native resolution; resizing and augmentation
+still happen at training time.
+
+📁 INPUT:
+---------
+- in_path: COCO JSON split (e.g., "annotations/train_split.json")
+- image_root: Root folder the COCO `file_name`s are relative to
+
+📤 OUTPUT:
+----------
+- frame_cache/frames.memmap    : raw uint8 BGR pixels of every frame
+- frame_cache/frames_index.npy : (image_id, offset, height, width, file_name)
+                                 per frame, file_name being the absolute
+                                 path of the source image
+
+🔐 DEPENDENCIES:
+----------------
+- NumPy
+- OpenCV (cv2)
+- ijson
+- tqdm
+
+🚀 HOW TO RUN:
+--------------
+python cache_frames.py
+
+=================================================================================
+"""
+
+import os
+import cv2
+import ijson
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+from atomic_io import atomic_open, atomic_path
+
+# Frames are decoded on our own thread pool; keep OpenCV single-threaded
+cv2.setNumThreads(0)
+
+FRAMES_FILE = "frames.memmap"
+INDEX_FILE = "frames_index.npy"
+
+# Fixed index fields; a "file_name" string field sized to the longest path
+# is appended per cache
+INDEX_FIELDS = [
+    ("image_id", np.int64),
+    ("offset", np.int64),
+    ("height", np.int32),
+    ("width", np.int32),
+]
+
+
+def cache_frames(in_path, image_root, out_dir="frame_cache", num_workers=None):
+    """
+    Decodes every image of a COCO split into one memory-mapped uint8 file.
+
+    Args:
+        in_path (str): COCO JSON file listing the images to cache
+        image_root (str): Root folder the COCO `file_name`s are relative to
+        out_dir (str): Output directory for the frame file and its index
+        num_workers (int, optional): Decode threads (default: all CPU cores)
+    """
+    with open(in_path, "rb") as f:
+        images = [
+            (img["id"], img["file_name"], img["height"], img["width"])
+            for img in ijson.items(f, "images.item")
+        ]
+
+    # Lay out frames back to back using the sizes recorded in the COCO file.
+    # Entries are looked up by the image's absolute path, not its image_id,
+    # since convert_to_coco.py reassigns IDs every time it runs.
+    abs_paths = [os.path.abspath(os.path.join(image_root, file_name)) for _, file_name, _, _ in images]
+    name_len = max((len(path) for path in abs_paths), default=1)
+    index = np.empty(len(images), dtype=INDEX_FIELDS + [("file_name", f"U{name_len}")])
+    offset = 0
+    for i, ((image_id, _, height, width), path) in enumerate(zip(images, abs_paths)):
+        index[i] = (image_id, offset, height, width, path)
+        offset += height * width * 3
+
+    os.makedirs(out_dir, exist_ok=True)
+    frames_path = os.path.join(out_dir, FRAMES_FILE)
+    index_path = os.path.join(out_dir, INDEX_FILE)
+
+    # Drop the old index first: until the new cache is complete, training falls
+    # back to decoding instead of pairing an old index with new frame data.
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    # Both files are written to temp names and moved into place only once
+    # complete, frames first and the index last.
+    with atomic_path(frames_path) as tmp_frames_path:
+        _write_frames(tmp_frames_path, images, index, offset, image_root, num_workers)
+    with atomic_open(index_path) as f:
+        np.save(f, index)
+
+    print(f"✅ Cached {len(images)} frames ({offset / 1e9:.2f} GB) → {out_dir}")
+
+
+def _write_frames(frames_path, images, index, total_size, image_root, num_workers):
+    """
+    Decodes `images` and writes their pixels into a new uint8 memmap at
+    `frames_path`, at the offsets given by `index`.
+    """
+    frames = np.memmap(frames_path, dtype=np.uint8, mode="w+", shape=(max(total_size, 1),))
+
+    def _decode(file_name):
+        return cv2.imread(os.path.join(image_root, file_name), cv2.IMREAD_COLOR)
+
+    # cv2.imread releases the GIL, so threads decode frames in parallel.
+    # Work is submitted in bounded batches so only a few decoded frames are
+    # held in memory at any time.
+    num_workers = num_workers or os.cpu_count() or 1
+    batch_size = 4 * num_workers
+    with ThreadPoolExecutor(max_workers=num_workers) as executor, \
+            tqdm(total=len(images), desc="Caching frames") as pbar:
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            decoded = executor.map(_decode, [file_name for _, file_name, _, _ in batch])
+            for (_, file_name, height, width), entry, image in zip(batch, index[start:], decoded):
+                if image is None:
+                    raise FileNotFoundError(f"Could not read image: {file_name}")
+                if image.shape[:2] != (height, width):
+                    raise ValueError(
+                        f"Size mismatch for {file_name}: got {image.shape[:2]}, "
+                        f"expected {(height, width)}"
+                    )
+                begin = int(entry["offset"])
+                frames[begin:begin + image.size] = image.reshape(-1)
+            pbar.update(len(batch))
+
+    frames.flush()
+    del frames
+
+
+# Entrypoint
+if __name__ == "__main__":
+    cache_frames(
+        in_path="annotations/train_split.json",
+        image_root="../../../../../../mount/Data1/Davang/CholecT50",
+        out_dir="frame_cache"
+    )
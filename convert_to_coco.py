@@ -41,7 +41,7 @@ which is required for training models like Detectron2’s Mask R-CNN.
 
 ✅ WHAT THE SCRIPT DOES:
 -------------------------
-1. Reads each LabelMe JSON file
+1. Reads each LabelMe JSON file (in parallel across all CPU cores)
 2. Extracts polygon points and labels
 3. Associates them with the corresponding image
 4. Computes bounding boxes and area
@@ -51,10 +51,10 @@ which is required for training models like Detectron2’s Mask R-CNN.
 🔐 DEPENDENCIES:
 ----------------
 - Python 3.x
-- OpenCV (cv2)
+- Pillow (PIL)
+- orjson
 - tqdm
 - glob
-- json
 
 🚀 HOW TO RUN:
 --------------
@@ -66,124 +66,257 @@ Or integrate it in a larger preprocessing pipeline.
 """
 
 import os
-import json
-import cv2
+import shutil
+import tempfile
+import orjson
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from glob import glob
+from itertools import chain, count, repeat
+from PIL import Image
 from tqdm import tqdm
 
+from atomic_io import atomic_open
 
-def labelme_to_coco(base_annotation_dir, base_image_dir, output_json_path):
+# LabelMe files handed to a worker process per task
+BATCH_SIZE = 64
+# Threads per worker process that prefetch JSON file contents
+IO_THREADS = 8
+
+
+def _list_video_dir(video_dir):
     """
-    Converts LabelMe-style annotations to COCO format for Detectron2/Mask R-CNN.
+    Lists a video frame directory with a single os.scandir, so resolving a
+    frame's extension is a set lookup instead of stat calls.
 
-    Args:
-        base_annotation_dir (str): Directory containing *_full/ann_dir/*.json files
-        base_image_dir (str): Root folder containing actual image files
-        output_json_path (str): Output file path for the COCO JSON
+    Returns:
+        frozenset: File names in the directory (empty if it is missing, not a
+                   directory, or unreadable)
     """
-    
-    annotation_files = glob(os.path.join(base_annotation_dir, "*_full", "ann_dir", "*.json"))
+    try:
+        with os.scandir(video_dir) as entries:
+            return frozenset(entry.name for entry in entries)
+    except OSError:
+        return frozenset()
 
-    coco_images = []
-    coco_annotations = []
-    coco_categories = []
 
-    category_name_to_id = {}
-    category_id_counter = 1
-    annotation_id = 1
-    image_id_map = {}
-    image_id_counter = 1
+@lru_cache(maxsize=None)
+def _read_image_size(image_path):
+    """
+    Reads (width, height) from the image header, cached per worker.
+
+    Image.open only parses the file header; the pixels are never decoded.
+
+    Returns:
+        tuple or None: (width, height), or None if the image is unreadable
+    """
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except OSError:
+        return None
 
-    for json_path in tqdm(annotation_files, desc="Converting"):
-        with open(json_path, 'r') as f:
-            annotation = json.load(f)
 
+def _resolve_image_paths(annotation_files, base_image_dir):
+    """
+    Matches each LabelMe JSON file to its frame image (.png preferred, then .jpg).
+
+    Every video directory is listed exactly once, in the parent process, and
+    shared by all files of that video.
+
+    Returns:
+        list: (json_path, relative_image_path) pairs for files whose image exists
+    """
+    dir_listings = {}
+    tasks = []
+    for json_path in annotation_files:
         raw_frame = os.path.basename(json_path).split(".")[0]  # e.g., t50_VID01_000468
         frame_id = raw_frame.split("_")[-1]
         video_id = raw_frame.split("_")[1]
 
+        if video_id not in dir_listings:
+            dir_listings[video_id] = _list_video_dir(os.path.join(base_image_dir, "videos", video_id))
+        video_files = dir_listings[video_id]
+
         filename_png = f"{frame_id}.png"
         filename_jpg = f"{frame_id}.jpg"
-        relative_path_png = os.path.join("videos", video_id, filename_png)
-        relative_path_jpg = os.path.join("videos", video_id, filename_jpg)
-        full_path_png = os.path.join(base_image_dir, relative_path_png)
-        full_path_jpg = os.path.join(base_image_dir, relative_path_jpg)
-
-        if os.path.exists(full_path_png):
-            image_path = full_path_png
-            relative_path = relative_path_png
-        elif os.path.exists(full_path_jpg):
-            image_path = full_path_jpg
-            relative_path = relative_path_jpg
+        if filename_png in video_files:
+            tasks.append((json_path, os.path.join("videos", video_id, filename_png)))
+        elif filename_jpg in video_files:
+            tasks.append((json_path, os.path.join("videos", video_id, filename_jpg)))
         else:
             print(f"⚠️ Image not found for frame {raw_frame} in {video_id}")
-            continue
-
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"⚠️ Could not read image: {image_path}")
-            continue
-        height, width = img.shape[:2]
-
-        if relative_path not in image_id_map:
-            image_id = image_id_counter
-            image_id_map[relative_path] = image_id
-            coco_images.append({
-                "id": image_id,
-                "file_name": relative_path,
-                "height": height,
-                "width": width
-            })
-            image_id_counter += 1
-        else:
-            image_id = image_id_map[relative_path]
-
-        for shape in annotation.get("shapes", []):
-            label = shape["label"]
-            points = shape["points"]
-
-            if label not in category_name_to_id:
-                category_name_to_id[label] = category_id_counter
-                category_id_counter += 1
-
-            category_id = category_name_to_id[label]
-
-            x_coords = [p[0] for p in points]
-            y_coords = [p[1] for p in points]
-            x_min = min(x_coords)
-            y_min = min(y_coords)
-            bbox_width = max(x_coords) - x_min
-            bbox_height = max(y_coords) - y_min
-
-            coco_annotations.append({
-                "id": annotation_id,
-                "image_id": image_id,
-                "category_id": category_id,
-                "segmentation": [sum(points, [])],
-                "bbox": [x_min, y_min, bbox_width, bbox_height],
-                "area": bbox_width * bbox_height,
-                "iscrowd": 0
-            })
-            annotation_id += 1
-
-    coco_categories = [
-        {"id": cid, "name": name}
-        for name, cid in category_name_to_id.items()
-    ]
+    return tasks
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _convert_annotation_file(raw_json, relative_path, base_image_dir):
+    """
+    Converts a single LabelMe JSON file without touching any global ID counters.
+
+    Runs inside a worker process, so it only returns plain data; the parent
+    process assigns image, annotation and category IDs in input order.
+
+    Args:
+        raw_json (bytes): Contents of the LabelMe JSON file
+        relative_path (str): Image path relative to base_image_dir
+        base_image_dir (str): Root folder containing actual image files
 
-    coco_dict = {
-        "images": coco_images,
-        "annotations": coco_annotations,
-        "categories": coco_categories
+    Returns:
+        tuple: (image_dict or None, list of annotation dicts without IDs,
+                list of labels in shape order)
+    """
+    annotation = orjson.loads(raw_json)
+
+    image_path = os.path.join(base_image_dir, relative_path)
+    image_size = _read_image_size(image_path)
+    if image_size is None:
+        print(f"⚠️ Could not read image: {image_path}")
+        return None, [], []
+    width, height = image_size
+
+    image = {
+        "file_name": relative_path,
+        "height": height,
+        "width": width
     }
 
-    os.makedirs(os.path.dirname(output_json_path), exist_ok=True)
-    with open(output_json_path, 'w') as f:
-        json.dump(coco_dict, f)
+    annotations = []
+    labels = []
+    for shape in annotation.get("shapes", []):
+        label = shape["label"]
+        points = shape["points"]
+
+        x_coords = [p[0] for p in points]
+        y_coords = [p[1] for p in points]
+        x_min = min(x_coords)
+        y_min = min(y_coords)
+        bbox_width = max(x_coords) - x_min
+        bbox_height = max(y_coords) - y_min
+
+        annotations.append({
+            "segmentation": [list(chain.from_iterable(points))],
+            "bbox": [x_min, y_min, bbox_width, bbox_height],
+            "area": bbox_width * bbox_height,
+            "iscrowd": 0
+        })
+        labels.append(label)
+
+    return image, annotations, labels
+
+
+# Per-worker thread pool for IO_THREADS, created on first use
+_io_pool = None
+
+
+def _convert_batch(batch, base_image_dir):
+    """
+    Converts a batch of (json_path, relative_image_path) pairs in a worker.
+
+    The batch's JSON files are read concurrently on a small thread pool, so
+    file-open latency on slow or remote storage overlaps with parsing.
+
+    Returns:
+        list: One _convert_annotation_file result per pair, in batch order
+    """
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_THREADS)
+
+    contents = _io_pool.map(_read_bytes, [json_path for json_path, _ in batch])
+    return [
+        _convert_annotation_file(raw_json, relative_path, base_image_dir)
+        for raw_json, (_, relative_path) in zip(contents, batch)
+    ]
+
+
+def labelme_to_coco(base_annotation_dir, base_image_dir, output_json_path, num_workers=None):
+    """
+    Converts LabelMe-style annotations to COCO format for Detectron2/Mask R-CNN.
+
+    Args:
+        base_annotation_dir (str): Directory containing *_full/ann_dir/*.json files
+        base_image_dir (str): Root folder containing actual image files
+        output_json_path (str): Output file path for the COCO JSON
+        num_workers (int, optional): Worker processes to use (default: all CPU cores)
+    """
+    
+    annotation_files = glob(os.path.join(base_annotation_dir, "*_full", "ann_dir", "*.json"))
+
+    # New labels get the next category ID on first lookup
+    category_name_to_id = defaultdict(count(1).__next__)
+    annotation_id = 1
+    image_id_map = {}
+    image_id_counter = 1
+
+    output_dir = os.path.dirname(output_json_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Records are serialized as soon as they are produced instead of being
+    # collected into one big dict. Images go straight into the output file
+    # (a temp file that only replaces output_json_path once complete);
+    # annotations are spooled to a temporary file and appended after the
+    # "images" array is closed.
+    with atomic_open(output_json_path) as out, \
+            tempfile.TemporaryFile('w+b', dir=output_dir or None, buffering=1 << 20) as ann_spool:
+        out.write(b'{"images":[')
+
+        tasks = _resolve_image_paths(annotation_files, base_image_dir)
+        batches = [tasks[i:i + BATCH_SIZE] for i in range(0, len(tasks), BATCH_SIZE)]
+
+        # Batches are converted in parallel, but results come back in input order
+        # so the ID assignment below stays deterministic.
+        with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+            results = chain.from_iterable(
+                executor.map(_convert_batch, batches, repeat(base_image_dir))
+            )
+
+            for image, annotations, labels in tqdm(results, total=len(tasks), desc="Converting"):
+                if image is None:
+                    continue
+
+                relative_path = image["file_name"]
+                if relative_path not in image_id_map:
+                    image_id = image_id_counter
+                    image_id_map[relative_path] = image_id
+                    if image_id > 1:
+                        out.write(b",")
+                    out.write(orjson.dumps({"id": image_id, **image}))
+                    image_id_counter += 1
+                else:
+                    image_id = image_id_map[relative_path]
+
+                for ann, label in zip(annotations, labels):
+                    if annotation_id > 1:
+                        ann_spool.write(b",")
+                    ann_spool.write(orjson.dumps({
+                        "id": annotation_id,
+                        "image_id": image_id,
+                        "category_id": category_name_to_id[label],
+                        **ann
+                    }))
+                    annotation_id += 1
+
+        out.write(b'],"annotations":[')
+        ann_spool.seek(0)
+        shutil.copyfileobj(ann_spool, out, 1 << 20)
+
+        coco_categories = [
+            {"id": cid, "name": name}
+            for name, cid in category_name_to_id.items()
+        ]
+        out.write(b'],"categories":')
+        out.write(orjson.dumps(coco_categories))
+        out.write(b'}')
 
     print(f"\n✅ COCO JSON saved at: {output_json_path}")
-    print(f"🖼️  Total images: {len(coco_images)}")
-    print(f"🔖 Total annotations: {len(coco_annotations)}")
+    print(f"🖼️  Total images: {image_id_counter - 1}")
+    print(f"🔖 Total annotations: {annotation_id - 1}")
     print(f"🏷️  Categories: {list(category_name_to_id.keys())}")
 
 
@@ -11,8 +11,9 @@ using Detectron2's built-in COCOEvaluator.
 It performs:
 1. COCO-style dataset registration using `test_split.json`.
 2. Loads the trained model weights from the output directory.
-3. Initializes the predictor and COCO evaluator.
-4. Computes detection and segmentation metrics on the test dataset.
+3. Builds the model and COCO evaluator.
+4. Runs batched (FP16 by default) inference and computes detection and segmentation metrics
+   on the test dataset.
 
 Expected:
 - Trained weights saved at `output_maskrcnn/model_final.pth`
@@ -23,9 +24,12 @@ Last updated: May 2025
 """
 
 import os
+import torch
+import torch._dynamo
 import detectron2
-from detectron2.engine import DefaultPredictor
+from detectron2.checkpoint import DetectionCheckpointer
 from detectron2.config import get_cfg
+from detectron2.modeling import build_model
 from detectron2 import model_zoo
 from detectron2.data import DatasetCatalog, MetadataCatalog, build_detection_test_loader
 from detectron2.evaluation import COCOEvaluator, inference_on_dataset
@@ -53,13 +57,26 @@ cfg.MODEL.ROI_HEADS.NUM_CLASSES = 7  # Number of instrument classes
 cfg.INPUT.MIN_SIZE_TEST = 800
 cfg.INPUT.MAX_SIZE_TEST = 1333
 
-# === Step 4: Initialize predictor and evaluator ===
-predictor = DefaultPredictor(cfg)
+# Number of test images run through the model per forward pass
+EVAL_BATCH_SIZE = 8
 
-# Build evaluation loader and evaluator
+# Run inference in FP16 (autocast) on the GPU; set False for full FP32
+USE_FP16 = True
+
+# === Step 4: Build model and evaluator ===
+model = build_model(cfg)
+DetectionCheckpointer(model).load(cfg.MODEL.WEIGHTS)
+model.eval()
+
+# Compile the backbone (dynamic shapes, since test images vary in size)
+torch._dynamo.config.cache_size_limit = 64
+model.backbone.forward = torch.compile(model.backbone.forward, dynamic=True)
+
+# Build batched evaluation loader and evaluator
 evaluator = COCOEvaluator(dataset_name, cfg, False, output_dir="./output/")
-val_loader = build_detection_test_loader(cfg, dataset_name)
+val_loader = build_detection_test_loader(cfg, dataset_name, batch_size=EVAL_BATCH_SIZE)
 
 # === Step 5: Run inference and evaluation ===
 print("🔍 Running inference on test set...")
-inference_on_dataset(predictor.model, val_loader, evaluator)
+with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=USE_FP16):
+    inference_on_dataset(model, val_loader, evaluator)
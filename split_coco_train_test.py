@@ -29,6 +29,9 @@ training and evaluation using Detectron2 or similar frameworks.
 - test_ratio: ratio of images to reserve for testing (default: 10%)
 - seed: random seed for reproducibility
 
+The input is streamed with ijson, so only the image IDs are held in memory
+even for very large COCO files.
+
 🚀 HOW TO RUN:
 --------------
 python split_coco_train_test.py
@@ -36,9 +39,45 @@ python split_coco_train_test.py
 =================================================================================
 """
 
-import json
 import os
 import random
+import ijson
+import orjson
+
+from atomic_io import atomic_open
+
+
+def _iter_coco(in_path, prefix):
+    """
+    Lazily yields the items under `prefix` (e.g. "images.item") from a COCO
+    JSON file without loading the whole file into memory.
+    """
+    with open(in_path, "rb") as f:
+        yield from ijson.items(f, prefix, use_float=True)
+
+
+def _route_records(records, key, train_ids, test_ids, train_f, test_f):
+    """
+    Streams each record into the train or test JSON array depending on
+    whether `record[key]` is a train or test image ID. Records matching
+    neither (e.g. annotations of missing images) are dropped.
+
+    Returns:
+        tuple: (number of train records, number of test records)
+    """
+    n_train = n_test = 0
+    for record in records:
+        if record[key] in test_ids:
+            if n_test:
+                test_f.write(b",")
+            test_f.write(orjson.dumps(record))
+            n_test += 1
+        elif record[key] in train_ids:
+            if n_train:
+                train_f.write(b",")
+            train_f.write(orjson.dumps(record))
+            n_train += 1
+    return n_train, n_test
 
 
 def split_coco_train_test(
@@ -47,44 +86,49 @@ def split_coco_train_test(
     test_ratio=0.1,
     seed=42
 ):
-    # Load the input COCO-style dataset
-    with open(in_path, "r") as f:
-        coco = json.load(f)
-
-    images = coco["images"]
-    annotations = coco["annotations"]
-    categories = coco["categories"]
+    # Only image IDs are kept in memory; images and annotations are streamed
+    # from the input and written straight to the split files.
+    img_ids = list(_iter_coco(in_path, "images.item.id"))
+    categories = list(_iter_coco(in_path, "categories.item"))
 
     # Shuffle image IDs reproducibly
     random.seed(seed)
-    img_ids = [img["id"] for img in images]
     random.shuffle(img_ids)
 
     # Calculate split sizes
     n_test = int(len(img_ids) * test_ratio)
-    test_ids = set(img_ids[:n_test])
-    train_ids = set(img_ids[n_test:])
-
-    # Split images and annotations
-    train_images = [img for img in images if img["id"] in train_ids]
-    test_images  = [img for img in images if img["id"] in test_ids]
-
-    train_annots = [ann for ann in annotations if ann["image_id"] in train_ids]
-    test_annots  = [ann for ann in annotations if ann["image_id"] in test_ids]
+    test_ids = frozenset(img_ids[:n_test])
+    train_ids = frozenset(img_ids[n_test:])
+    del img_ids
 
     # Ensure output directory exists
     os.makedirs(out_dir, exist_ok=True)
 
-    # Save split JSONs
-    with open(os.path.join(out_dir, "train_split.json"), "w") as f:
-        json.dump({"images": train_images, "annotations": train_annots, "categories": categories}, f)
-
-    with open(os.path.join(out_dir, "test_split.json"), "w") as f:
-        json.dump({"images": test_images, "annotations": test_annots, "categories": categories}, f)
+    # Stream images and annotations into the split JSONs
+    train_path = os.path.join(out_dir, "train_split.json")
+    test_path = os.path.join(out_dir, "test_split.json")
+    # Both splits are written to temp files and only replace the existing
+    # outputs once fully written, so a failed run leaves them untouched.
+    with atomic_open(train_path) as train_f, atomic_open(test_path) as test_f:
+        train_f.write(b'{"images":[')
+        test_f.write(b'{"images":[')
+        n_train_images, n_test_images = _route_records(
+            _iter_coco(in_path, "images.item"), "id", train_ids, test_ids, train_f, test_f
+        )
+
+        train_f.write(b'],"annotations":[')
+        test_f.write(b'],"annotations":[')
+        _route_records(
+            _iter_coco(in_path, "annotations.item"), "image_id", train_ids, test_ids, train_f, test_f
+        )
+
+        categories_json = orjson.dumps(categories)
+        train_f.write(b'],"categories":' + categories_json + b'}')
+        test_f.write(b'],"categories":' + categories_json + b'}')
 
     # Summary
-    print(f"✅ Wrote {len(train_images)} train images → annotations/train_split.json")
-    print(f"✅ Wrote {len(test_images)}  test images  → annotations/test_split.json")
+    print(f"✅ Wrote {n_train_images} train images → {train_path}")
+    print(f"✅ Wrote {n_test_images}  test images  → {test_path}")
 
 
 # Entrypoint
@@ -11,9 +11,12 @@ on instrument segmentation annotations in COCO format.
 Steps Covered:
 1. Registers the COCO-style training and test datasets.
 2. Loads a base Mask R-CNN config (R_50 + FPN).
-3. Updates training hyperparameters like learning rate, batch size, iterations.
+3. Updates training hyperparameters like learning rate, batch size, iterations,
+   and enables mixed-precision (AMP) training.
 4. Sets number of instrument classes (7 in CholecInstanceSeg).
-5. Initializes Detectron2's `DefaultTrainer` and starts training.
+5. Initializes a `DefaultTrainer` subclass whose data loader reads frames from
+   the `cache_frames.py` memmap cache (or decodes them with OpenCV if there is
+   no cache), and starts training.
 6. Saves logs and weights to `output_maskrcnn/`.
 
 Requirements:
@@ -26,7 +29,12 @@ Last updated: May 2025
 """
 
 import os
+import copy
 import logging
+import cv2
+import numpy as np
+import torch
+import torch._dynamo
 from detectron2.utils.logger import setup_logger
 
 # Initialize logging for Detectron2
@@ -36,13 +44,178 @@ setup_logger()
 from detectron2.engine import DefaultTrainer
 from detectron2.config import get_cfg
 from detectron2 import model_zoo
+from detectron2.data import DatasetMapper, build_detection_train_loader
+from detectron2.data import detection_utils as utils
+from detectron2.data import transforms as T
 from detectron2.data.datasets import register_coco_instances
 
+from cache_frames import FRAMES_FILE, INDEX_FILE
+
+# Frames are decoded in data loader worker processes; keep OpenCV
+# single-threaded so the workers don't oversubscribe the CPU
+cv2.setNumThreads(0)
+
+# Allow TF32 for the ops that stay in FP32 under AMP. cuDNN benchmarking is
+# left off (Detectron2's CUDNN_BENCHMARK default): multi-scale inputs and the
+# per-iteration number of mask-head ROIs keep producing new conv shapes.
+torch.set_float32_matmul_precision("high")
+
+# Input sizes vary with multi-scale training; allow more compiled variants
+torch._dynamo.config.cache_size_limit = 64
+
+
+# === Data loading ===
+class FastDecodeMapper(DatasetMapper):
+    """
+    DatasetMapper that decodes frames with OpenCV instead of PIL.
+
+    cv2.imread returns BGR directly (Detectron2's default INPUT.FORMAT), so
+    the PIL decode + EXIF handling + RGB->BGR copy in `utils.read_image`
+    is skipped for every training sample. `__call__` follows upstream
+    `DatasetMapper.__call__`; only the image read goes through `_read_image`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.image_format != "BGR":
+            raise ValueError(
+                f"{type(self).__name__} only produces BGR images, "
+                f"got INPUT.FORMAT={self.image_format!r}"
+            )
+
+    def _read_image(self, dataset_dict):
+        image = cv2.imread(dataset_dict["file_name"], cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"Could not read image: {dataset_dict['file_name']}")
+        utils.check_image_size(dataset_dict, image)
+        return image
+
+    def __call__(self, dataset_dict):
+        dataset_dict = copy.deepcopy(dataset_dict)
+        image = self._read_image(dataset_dict)
+
+        if "sem_seg_file_name" in dataset_dict:
+            sem_seg_gt = utils.read_image(dataset_dict.pop("sem_seg_file_name"), "L").squeeze(2)
+        else:
+            sem_seg_gt = None
+
+        aug_input = T.AugInput(image, sem_seg=sem_seg_gt)
+        transforms = self.augmentations(aug_input)
+        image, sem_seg_gt = aug_input.image, aug_input.sem_seg
+
+        image_shape = image.shape[:2]
+        dataset_dict["image"] = torch.as_tensor(np.ascontiguousarray(image.transpose(2, 0, 1)))
+        if sem_seg_gt is not None:
+            dataset_dict["sem_seg"] = torch.as_tensor(sem_seg_gt.astype("long"))
+
+        if self.proposal_topk is not None:
+            utils.transform_proposals(
+                dataset_dict, image_shape, transforms, proposal_topk=self.proposal_topk
+            )
+
+        if not self.is_train:
+            dataset_dict.pop("annotations", None)
+            dataset_dict.pop("sem_seg_file_name", None)
+            return dataset_dict
+
+        if "annotations" in dataset_dict:
+            self._transform_annotations(dataset_dict, transforms, image_shape)
+        return dataset_dict
+
+
+class CachedFrameMapper(FastDecodeMapper):
+    """
+    FastDecodeMapper that slices pre-decoded frames out of the memory-mapped
+    cache written by `cache_frames.py` instead of decoding PNGs.
+
+    Frames are looked up by the image's absolute path rather than its
+    image_id, so a regenerated COCO file or split can never be served
+    another frame's pixels. Images missing from the cache fall back to a
+    regular OpenCV decode.
+    """
+
+    def __init__(self, cfg, is_train=True, cache_dir="frame_cache"):
+        super().__init__(cfg, is_train=is_train)
+        index = np.load(os.path.join(cache_dir, INDEX_FILE))
+        self.frame_index = {
+            file_name: (int(offset), int(height), int(width))
+            for _, offset, height, width, file_name in index.tolist()
+        }
+        self.frames_path = os.path.join(cache_dir, FRAMES_FILE)
+
+        # The frames file must hold exactly the bytes the index describes
+        # (cache_frames.py writes at least one byte for an empty cache)
+        expected_size = max(
+            (offset + height * width * 3 for offset, height, width in self.frame_index.values()),
+            default=0
+        )
+        actual_size = os.path.getsize(self.frames_path) if os.path.exists(self.frames_path) else None
+        if actual_size != max(expected_size, 1):
+            raise RuntimeError(
+                f"Stale or corrupt frame cache in {cache_dir}: index expects "
+                f"{expected_size} bytes but {FRAMES_FILE} has {actual_size}. "
+                f"Re-run cache_frames.py or delete {cache_dir}."
+            )
+
+        # Opened lazily so each data loader worker maps the file itself
+        # instead of receiving a pickled copy of it
+        self._frames = None
+
+    def _read_image(self, dataset_dict):
+        entry = self.frame_index.get(os.path.abspath(dataset_dict["file_name"]))
+        if entry is None:
+            return super()._read_image(dataset_dict)
+
+        if self._frames is None:
+            self._frames = np.memmap(self.frames_path, dtype=np.uint8, mode="r")
+        offset, height, width = entry
+        image = self._frames[offset:offset + height * width * 3].reshape(height, width, 3)
+        utils.check_image_size(dataset_dict, image)
+        return image
+
+
+class Trainer(DefaultTrainer):
+    """
+    DefaultTrainer that compiles the backbone with torch.compile and feeds
+    training batches through CachedFrameMapper when a frame cache exists,
+    and through FastDecodeMapper otherwise.
+    """
+
+    @classmethod
+    def build_model(cls, cfg):
+        model = super().build_model(cfg)
+        # Compile the backbone's forward rather than wrapping the module, so
+        # state_dict keys (and therefore checkpoints) stay unchanged
+        model.backbone.forward = torch.compile(model.backbone.forward, dynamic=True)
+        return model
+
+    @classmethod
+    def build_train_loader(cls, cfg):
+        if os.path.exists(os.path.join(FRAME_CACHE_DIR, INDEX_FILE)):
+            mapper = CachedFrameMapper(cfg, is_train=True, cache_dir=FRAME_CACHE_DIR)
+        else:
+            mapper = FastDecodeMapper(cfg, is_train=True)
+        # With ASPECT_RATIO_GROUPING (the default) the torch DataLoader yields
+        # one dataset dict at a time and batches are only formed afterwards
+        # by AspectRatioGroupedDataset. pin_memory therefore pins each
+        # sample's "image" tensor as it comes out of the loader, which lets the
+        # (still blocking) .to(device) in GeneralizedRCNN.preprocess_image copy
+        # it without a pageable staging buffer. prefetch_factor=4 keeps up to
+        # 4 samples (not batches) in flight per worker.
+        return build_detection_train_loader(
+            cfg,
+            mapper=mapper,
+            pin_memory=True,
+            prefetch_factor=4,
+        )
+
+
 # === Define Paths ===
 DATASET_ROOT = "../../../../../../mount/Data1/Davang/CholecT50"
 TRAIN_JSON = "annotations/train_split.json"
 TEST_JSON = "annotations/test_split.json"
 OUTPUT_DIR = "./output_maskrcnn"
+FRAME_CACHE_DIR = "frame_cache"          # Written by cache_frames.py (optional)
 
 # === Register Datasets ===
 # Register COCO-style train/test datasets for Detectron2
@@ -60,7 +233,7 @@ cfg.merge_from_file(model_zoo.get_config_file(
 # Dataset assignment
 cfg.DATASETS.TRAIN = ("cholec_train",)
 cfg.DATASETS.TEST = ("cholec_test",)
-cfg.DATALOADER.NUM_WORKERS = 4
+cfg.DATALOADER.NUM_WORKERS = min(os.cpu_count() or 1, 8)
 
 # Load pre-trained COCO weights
 cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(
@@ -71,6 +244,7 @@ cfg.MODEL.WEIGHTS = model_zoo.get_checkpoint_url(
 cfg.SOLVER.IMS_PER_BATCH = 4            # Number of images per batch
 cfg.SOLVER.BASE_LR = 0.00025            # Learning rate
 cfg.SOLVER.MAX_ITER = 5000              # Total number of iterations
+cfg.SOLVER.AMP.ENABLED = True           # Mixed-precision (FP16) training
 
 # ROI Head configuration
 cfg.MODEL.ROI_HEADS.BATCH_SIZE_PER_IMAGE = 128
@@ -82,6 +256,6 @@ os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
 
 # === Launch training ===
 if __name__ == "__main__":
-    trainer = DefaultTrainer(cfg)
+    trainer = Trainer(cfg)
     trainer.resume_or_load(resume=False)
     trainer.train()